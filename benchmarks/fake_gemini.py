@@ -0,0 +1,194 @@
+"""
+Local stand-in for the Gemini generateContent / streamGenerateContent endpoints.
+
+Answers every request with a canned fitness reply after a configurable delay, and can
+inject rate limits (429 with Retry-After), server errors (500), SAFETY finishes and
+blocked prompts at configurable rates. Streamed responses are sent as SSE chunks.
+
+    python -m benchmarks.fake_gemini --port 8765 --latency 0.8 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_WORDS = (
+    "Remember to consult with your doctor or a qualified fitness professional before starting any new "
+    "exercise program. A good place to start is **Bodyweight Squats**, **Push-ups** and **Planks**, "
+    "three times a week, focusing on form before adding volume. How much time can you dedicate per session?"
+).split(" ")
+
+
+class FakeGeminiConfig:
+    """Behaviour of the fake server; all rates are probabilities per request."""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, first_token_latency: float = 0.15,
+                 chunks: int = 8, error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 1.0,
+                 safety_rate: float = 0.0, blocked_rate: float = 0.0, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.first_token_latency = first_token_latency
+        self.chunks = chunks
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.safety_rate = safety_rate
+        self.blocked_rate = blocked_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def outcome(self) -> str:
+        with self._lock:
+            self.requests += 1
+            roll = self.random.random()
+        for outcome, rate in (("rate_limit", self.rate_limit_rate), ("error", self.error_rate),
+                              ("blocked", self.blocked_rate), ("safety", self.safety_rate)):
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return "ok"
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+
+def _candidate(text: str, finish_reason: str = None) -> dict:
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if finish_reason:
+        candidate["finishReason"] = finish_reason
+    return candidate
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = FakeGeminiConfig()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        outcome = self.config.outcome()
+        streaming = ":streamGenerateContent" in self.path
+
+        if outcome == "rate_limit":
+            self._sendJSON(429, {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"}},
+                           {"Retry-After": f"{self.config.retry_after:g}"})
+            return
+        if outcome == "error":
+            time.sleep(self.config.first_token_latency)
+            self._sendJSON(500, {"error": {"code": 500, "message": "An internal error has occurred.", "status": "INTERNAL"}})
+            return
+        if outcome == "blocked":
+            time.sleep(self.config.first_token_latency)
+            self._sendEvents(streaming, [{"promptFeedback": {"blockReason": "SAFETY"}}], 0)
+            return
+
+        words = REPLY_WORDS
+        chunk_count = max(1, self.config.chunks)
+        size = -(-len(words) // chunk_count)
+        texts = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        events = [{"candidates": [_candidate(text)]} for text in texts]
+        if outcome == "safety":
+            events = events[:len(events) // 2] + [{"candidates": [{"finishReason": "SAFETY"}]}]
+        else:
+            events[-1]["candidates"][0]["finishReason"] = "STOP"
+
+        total = self.config.delay()
+        time.sleep(min(total, self.config.first_token_latency) if streaming else total)
+        if streaming:
+            interval = max(0.0, total - self.config.first_token_latency) / max(1, len(events) - 1)
+            self._sendEvents(True, events, interval)
+        else:
+            text = "".join(event["candidates"][0].get("content", {}).get("parts", [{}])[0].get("text", "") for event in events)
+            candidate = _candidate(text, "SAFETY" if outcome == "safety" else "STOP")
+            if outcome == "safety" and not text:
+                del candidate["content"]
+            self._sendJSON(200, {"candidates": [candidate]})
+
+    def _sendJSON(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _sendEvents(self, streaming: bool, events: list, interval: float):
+        if not streaming:
+            self._sendJSON(200, events[0])
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, event in enumerate(events):
+            if i:
+                time.sleep(interval)
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def startFakeGemini(config: FakeGeminiConfig = None, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Starts the fake server on a background thread and returns it. Its model URL
+    (for ChatEngine(model_url=...)) is http://host:server.server_port/v1beta/models/fake.
+    """
+    handler = type("ConfiguredFakeGeminiHandler", (FakeGeminiHandler,), {"config": config or FakeGeminiConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
+
+
+def modelURL(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1beta/models/fake"
+
+
+def addConfigArguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean seconds until the full response is sent.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Uniform +/- jitter applied to --latency.")
+    parser.add_argument("--first-token-latency", type=float, default=0.15, help="Seconds until the first streamed chunk.")
+    parser.add_argument("--chunks", type=int, default=8, help="Number of SSE chunks per streamed response.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429 responses.")
+    parser.add_argument("--safety-rate", type=float, default=0.0, help="Fraction of responses ending with finishReason SAFETY.")
+    parser.add_argument("--blocked-rate", type=float, default=0.0, help="Fraction of prompts blocked via promptFeedback.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible outcomes.")
+
+
+def configFromArguments(args) -> FakeGeminiConfig:
+    return FakeGeminiConfig(
+        latency=args.latency, jitter=args.jitter, first_token_latency=args.first_token_latency, chunks=args.chunks,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+        safety_rate=args.safety_rate, blocked_rate=args.blocked_rate, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    addConfigArguments(parser)
+    args = parser.parse_args()
+
+    server = startFakeGemini(configFromArguments(args), args.host, args.port)
+    print(f"Fake Gemini listening; use model URL {modelURL(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
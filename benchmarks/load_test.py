@@ -0,0 +1,168 @@
+"""
+Replays chat transcripts against ChatEngine at a target number of concurrent sessions
+and reports latency percentiles, time-to-first-token, throughput and FAQ/cache hit rates.
+
+By default the engine talks to an in-process fake Gemini server (benchmarks.fake_gemini)
+and a throwaway response cache, so runs are reproducible and free:
+
+    python -m benchmarks.load_test --concurrency 50 --sessions 200 --latency 0.8
+    python -m benchmarks.load_test --no-stream --rate-limit-rate 0.1 --json report.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_gemini import addConfigArguments, configFromArguments, modelURL, startFakeGemini
+from chat_engine import ChatEngine
+from gemini_client import getSharedClient
+from request_scheduler import RequestScheduler
+from response_cache import ResponseCache
+from session_store import SessionStore
+
+DEFAULT_TRANSCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcripts.jsonl")
+
+
+def loadTranscripts(path: str) -> list:
+    """Loads transcripts from a JSONL file; each line is {"id": ..., "messages": [user messages...]}."""
+    with open(path, encoding="utf-8") as transcript_file:
+        return [json.loads(line)["messages"] for line in transcript_file if line.strip()]
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of `values` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class TurnResult:
+    __slots__ = ("latency", "first_token", "source", "status")
+
+    def __init__(self, latency: float, first_token: float, source: str, status: str):
+        self.latency = latency
+        self.first_token = first_token
+        self.source = source
+        self.status = status
+
+
+async def runTurn(engine: ChatEngine, session_id, message: str, stream: bool) -> TurnResult:
+    started = time.perf_counter()
+    first_token = None
+    if stream:
+        async for reply in engine.chat_stream(session_id, message):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+    else:
+        reply = await engine.chat(session_id, message)
+    latency = time.perf_counter() - started
+    return TurnResult(latency, first_token if first_token is not None else latency, reply.source, reply.status)
+
+
+async def runLoad(engine: ChatEngine, transcripts: list, sessions: int, concurrency: int, stream: bool, think_time: float) -> tuple:
+    """Runs `sessions` sessions (cycling through `transcripts`), at most `concurrency` at a time."""
+    gate = asyncio.Semaphore(concurrency)
+    results = []
+
+    async def runSession(index: int):
+        async with gate:
+            for message in transcripts[index % len(transcripts)]:
+                results.append(await runTurn(engine, f"bench-{index}", message, stream))
+                if think_time:
+                    await asyncio.sleep(think_time)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(runSession(i) for i in range(sessions)))
+    return results, time.perf_counter() - started
+
+
+def buildReport(results: list, wall_time: float, engine: ChatEngine, scheduler: RequestScheduler, upstream_requests) -> dict:
+    def summary(turns: list) -> dict:
+        latencies = [turn.latency * 1000 for turn in turns]
+        first_tokens = [turn.first_token * 1000 for turn in turns]
+        return {
+            "turns": len(turns),
+            "latency_ms": {name: round(percentile(latencies, q), 1) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+            "ttft_ms": {name: round(percentile(first_tokens, q), 1) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        }
+
+    sources = Counter(turn.source for turn in results)
+    statuses = Counter(turn.status for turn in results)
+    total = max(1, len(results))
+    return {
+        "wall_time_s": round(wall_time, 3),
+        "throughput_turns_per_s": round(len(results) / wall_time, 2) if wall_time else 0.0,
+        "all": summary(results),
+        "api": summary([turn for turn in results if turn.source == "api"]),
+        "faq_hit_rate": round(sources["faq"] / total, 4),
+        "cache_hit_rate": round(sources["cache"] / total, 4),
+        "statuses": dict(statuses),
+        "response_cache": engine.response_cache.stats(),
+        "scheduler": {"retries": scheduler.retries, "coalesced": scheduler.coalesced},
+        "sessions": engine.sessions.stats(),
+        "upstream_requests": upstream_requests,
+    }
+
+
+def printReport(report: dict):
+    print(f"turns: {report['all']['turns']}  wall: {report['wall_time_s']}s  throughput: {report['throughput_turns_per_s']} turns/s")
+    for name in ("all", "api"):
+        section = report[name]
+        latency, ttft = section["latency_ms"], section["ttft_ms"]
+        print(f"{name:>4} ({section['turns']:>5} turns)  latency p50/p95/p99: {latency['p50']}/{latency['p95']}/{latency['p99']} ms"
+              f"  ttft p50/p95/p99: {ttft['p50']}/{ttft['p95']}/{ttft['p99']} ms")
+    print(f"faq hit rate: {report['faq_hit_rate']:.1%}  cache hit rate: {report['cache_hit_rate']:.1%}")
+    print(f"statuses: {report['statuses']}")
+    print(f"scheduler: {report['scheduler']}  upstream requests: {report['upstream_requests']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transcripts", default=DEFAULT_TRANSCRIPTS, help="JSONL file of transcripts to replay.")
+    parser.add_argument("--sessions", type=int, default=None, help="Sessions to run (default: one per transcript).")
+    parser.add_argument("--concurrency", type=int, default=20, help="Sessions running at the same time.")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds a session waits between turns.")
+    parser.add_argument("--no-stream", dest="stream", action="store_false", help="Use generateContent instead of streaming.")
+    parser.add_argument("--model-url", default=None, help="Gemini model URL to target instead of the in-process fake server.")
+    parser.add_argument("--cache-path", default=None, help="Response cache file (default: a fresh temporary file).")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="Scheduler cap on in-flight upstream requests.")
+    parser.add_argument("--requests-per-minute", type=float, default=100000, help="Scheduler requests-per-minute limit.")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the report as JSON to this file.")
+    addConfigArguments(parser)
+    args = parser.parse_args()
+
+    server = None
+    if args.model_url:
+        engine_kwargs = {"model_url": args.model_url}
+    else:
+        server = startFakeGemini(configFromArguments(args))
+        engine_kwargs = {"model_url": modelURL(server), "api_key": "fake"}
+
+    work_dir = tempfile.mkdtemp(prefix="fitness-bench-")
+    cache_path = args.cache_path or os.path.join(work_dir, "responses.sqlite3")
+    scheduler = RequestScheduler(max_concurrency=args.max_concurrency, requests_per_minute=args.requests_per_minute)
+    engine = ChatEngine(response_cache=ResponseCache(cache_path), scheduler=scheduler,
+                        session_store=SessionStore(os.path.join(work_dir, "sessions.sqlite3")), **engine_kwargs)
+    transcripts = loadTranscripts(args.transcripts)
+    sessions = args.sessions or len(transcripts)
+
+    results, wall_time = getSharedClient().run(runLoad(engine, transcripts, sessions, args.concurrency, args.stream, args.think_time))
+    report = buildReport(results, wall_time, engine, scheduler, server.RequestHandlerClass.config.requests if server else None)
+    printReport(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2)
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Micro-benchmarks the per-request JSON work of a Gemini call: building and serializing
+the request body, and parsing a generateContent response and a streamed chunk.
+
+Compares the original path (a fresh payload dict serialized with stdlib json, as httpx
+does for json=...) with the precomputed template and the fast_json backend:
+
+    python -m benchmarks.payload_bench --turns 20 --number 2000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_engine import buildRequestBody, buildRequestPayload
+from fast_json import JSON_BACKEND, loadsJSON
+
+
+def sampleContents(turns: int) -> list:
+    """A conversation window of `turns` user/model pairs of typical length."""
+    contents = []
+    for i in range(turns):
+        contents.append({"role": "user", "parts": [{"text": f"Question {i}: how many sets and reps should I do for squats this week?"}]})
+        contents.append({"role": "model", "parts": [{"text": "For strength, aim for 3-5 sets of 3-6 reps with 2-3 minutes of rest. " * 6}]})
+    contents.append({"role": "user", "parts": [{"text": "And what should I eat after training?"}]})
+    return contents
+
+
+def sampleResponse() -> bytes:
+    text = "After training, combine 20-40 g of protein with some carbohydrates within a couple of hours. " * 12
+    return json.dumps({
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0,
+                        "safetyRatings": [{"category": "HARM_CATEGORY_HARASSMENT", "probability": "NEGLIGIBLE"}] * 4}],
+        "usageMetadata": {"promptTokenCount": 1200, "candidatesTokenCount": 260, "totalTokenCount": 1460},
+    }).encode()
+
+
+def measure(function, number: int) -> float:
+    """Best-of-5 microseconds per call."""
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+
+def stdlibBody(contents: list) -> bytes:
+    # httpx's json= path: json.dumps with default separators, then encode.
+    return json.dumps(buildRequestPayload(contents), ensure_ascii=False).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10, help="User/model pairs in the conversation window.")
+    parser.add_argument("--number", type=int, default=2000, help="Calls per timing run.")
+    args = parser.parse_args()
+
+    contents = sampleContents(args.turns)
+    response = sampleResponse()
+    chunk = b'{"candidates":[{"content":{"role":"model","parts":[{"text":"Aim for 20-40 g of protein "}]},"index":0}]}'
+    assert json.loads(buildRequestBody(contents)) == buildRequestPayload(contents)
+
+    rows = [
+        ("request body", measure(lambda: stdlibBody(contents), args.number), measure(lambda: buildRequestBody(contents), args.number)),
+        ("response decode", measure(lambda: json.loads(response), args.number), measure(lambda: loadsJSON(response), args.number)),
+        ("stream chunk decode", measure(lambda: json.loads(chunk), args.number * 10), measure(lambda: loadsJSON(chunk), args.number * 10)),
+    ]
+
+    print(f"json backend: {JSON_BACKEND}  request body: {len(buildRequestBody(contents))} bytes  response: {len(response)} bytes")
+    print(f"{'':<20}{'stdlib µs':>12}{'fast µs':>12}{'saved':>10}")
+    for name, before, after in rows:
+        print(f"{name:<20}{before:>12.2f}{after:>12.2f}{1 - after / before:>10.1%}")
+    total_before = rows[0][1] + rows[1][1]
+    total_after = rows[0][2] + rows[1][2]
+    print(f"per generateContent call: {total_before:.2f} -> {total_after:.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
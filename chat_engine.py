@@ -0,0 +1,392 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+
+import httpx
+from dotenv import load_dotenv
+
+from fast_json import dumpsJSON, loadsJSON
+from faq_matcher import FAQMatcher, loadFAQs
+from history_manager import ConversationHistory, estimateTokens
+from metrics import (FIRST_TOKEN_SECONDS, PROMPT_CHARS, RESPONSE_CHARS, STAGE_SECONDS, TURNS,
+                     counterLines, logEvent, recordOutcome, span)
+from request_scheduler import getScheduler
+from response_cache import ResponseCache, makeCacheKey
+from session_store import SessionStore
+
+load_dotenv()
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash"
+STREAMING_ENABLED = os.getenv("GEMINI_STREAMING", "1") not in ("0", "false", "False")
+
+SYSTEM_INSTRUCTION = (
+    "\n**Core Principle: User Safety First.** Always preface advice with a disclaimer, especially on first interaction or when suggesting new routines/significant changes. Example: 'Remember to consult with your doctor or a qualified fitness professional before starting any new exercise program or making significant changes to your diet. My suggestions are for informational purposes only and are not a substitute for professional medical advice.'"
+    "\n\nWhen a user interacts with you:"
+    "\n1. If the user's query is clearly a request for fitness guidance (e.g., 'suggest a workout for abs,' 'how can I eat healthier?', 'I need motivation to exercise'):"
+    "   a. Try to understand their specific goals, current fitness level, preferences, and any limitations they mention. If the request is vague (e.g., 'help me get fit'), ask clarifying questions "
+    "      like 'What are your main fitness goals (e.g., weight loss, muscle gain, endurance, flexibility)?', 'What's your current experience with exercise?', 'Do you have access to a gym or prefer home workouts?', 'How much time can you dedicate?', or 'Are there any types of activities you particularly enjoy or dislike?'. "
+    "   b. Aim to provide 2-4 distinct and actionable suggestions if possible (e.g., specific exercises, a sample workout structure, meal ideas). For each suggestion, briefly explain its benefits, how to perform it correctly (if an exercise, with emphasis on form and safety), or why it aligns with their goals. "
+    "   c. Use markdown formatting to make your answers clear and engaging: "
+    "      - Use bolding for exercise names, routine titles, or key concepts (e.g., '**Push-ups**', '**Beginner Full Body Routine**', '**Calorie Deficit**'). "
+    "      - Use bullet points (hyphens or asterisks) for lists of exercises, tips, or meal components. "
+    "      - Use paragraphs for explanations and instructions. "
+    "   d. Utilize the provided conversation history from the current session effectively. "
+    "      - Avoid re-suggesting exercises or plans already discussed and dismissed in this ongoing conversation unless the user asks for them again or for more details/modifications."
+    "      - If the user has mentioned goals, preferences, limitations, or progress earlier in the current conversation, acknowledge this and incorporate that context into your current suggestions to make them more personalized and coherent. For example, 'Since you mentioned you want to focus on upper body strength and have access to dumbbells, here are a couple of routines...'"
+    "   e. Always prioritize safety. If a user mentions a potential injury or medical condition, gently remind them to consult a healthcare professional and offer to provide general fitness information that doesn't exacerbate their condition, if appropriate and safe. (e.g., 'I can't give advice for specific injuries, but if you're cleared for gentle activity, perhaps some light stretching or mobility work could be discussed?')"
+    "\n2. If the user's query is not a request for fitness guidance (e.g., asking 'What is the capital of Spain?', 'Who are you beyond a fitness bot?', 'Tell me a story?', 'What's the weather like?', 'Calculate my mortgage'):"
+    "   a. You must politely decline to answer the question directly. "
+    "   b. Clearly state your specialized role as a Fitness Chatbot. "
+    "   c. Immediately attempt to redirect the conversation back to fitness, exercise, nutrition, or motivation. "
+    "   d. Example refusals: "
+    "      - User: 'What's the latest news?' You: 'My focus is on helping you with your fitness journey! I can't provide news updates, but I can definitely help you plan your next workout or offer some healthy eating tips. What are you working on today?'"
+    "      - User: 'Can you explain quantum physics?' You: 'I'm designed to be your go-to for fitness and nutrition information. While I can't explain quantum physics, perhaps you'd like some tips on improving your workout intensity or understanding macronutrients?'"
+    "      - User: 'Tell me about your creators.' You: 'I'm a Fitness Chatbot AI, here to assist you with your exercise routines, nutrition questions, and keeping you motivated! Do you have any fitness goals you'd like to discuss?'"
+    "\n3. If a user asks for something you cannot ethically or safely provide (e.g., advice on illegal substances, promotion of eating disorders, extremely dangerous exercises, or specific medical advice/diagnosis): "
+    "   a. Politely and firmly state that you cannot help with that specific request due to safety, ethical, or scope limitations. "
+    "   b. Do not be preachy, but be clear. "
+    "   c. Offer to help with safe and appropriate fitness-related topics. Example: 'Icannot provide guidance on [harmful request]. My purpose is to promote health and safety. However, I can help you with creating a balanced workout plan or offer tips for healthy eating if you're interested.'"
+    "\n4. Do not invent exercises, nutritional information, or unsubstantiated fitness claims. If you are unsure about a very specific or obscure request, or if it borders on medical advice: "
+    "   a. State that you don't have specific information on that item or that it's outside your scope. "
+    "   b. Offer to provide information on more general, established, and safe alternatives or related concepts. "
+    "   c. Reiterate the importance of consulting with qualified professionals for specific or complex needs. Example: 'I don't have information on that specific unconventional training method. It's always best to stick to well-researched exercises or consult a certified trainer for such specialized requests. Would you like help with some foundational strength exercises instead?'"
+    "\n5. Your tone should be helpful, friendly, encouraging, motivating, and empathetic, but also firm on matters of safety and scope. "
+    "\n6. Exception for factual fitness-related questions: If a user asks a factual question directly related to fitness, exercise, or general nutrition that could lead to or support guidance (e.g., 'What muscles do lunges work?', 'How many calories in a banana?', 'What is HIIT?'):"
+    "   a. You can provide a brief, concise, and accurate answer. "
+    "   b. Then, try to pivot to personalized advice or a recommendation. Do not go into overly lengthy explanations. "
+    "   c. Example: 'Lunges primarily work your quadriceps, glutes, and hamstrings, and also engage your core for stability. They are a great compound exercise! Would you like to incorporate them into a leg workout routine, or learn some variations?'"
+    "\n\nStick to your role as a Fitness Chatbot AI diligently. Your goal is to guide and support users in their fitness journey safely and effectively, not to be a general conversationalist or a substitute for professional medical or certified expert advice. Be mindful of the ongoing conversation to provide a seamless, intelligent, and motivating fitness support experience."
+)
+
+
+GENERATION_CONFIG = {
+    "temperature": 0.75,
+    "topP": 0.95,
+    "topK": 40,
+    "maxOutputTokens": 1500
+}
+
+
+def buildRequestPayload(conversation_api_history: list) -> dict:
+    """Builds the Gemini request body for the given conversation history."""
+    return {
+        "contents": conversation_api_history,
+        "system_instruction": {
+            "parts": [{"text": SYSTEM_INSTRUCTION}]
+        },
+        "generationConfig": GENERATION_CONFIG,
+        "safetySettings": [
+            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+        ]
+    }
+
+
+# The static part of every request (system instruction, generation config, safety settings)
+# is serialized once; each request only serializes its `contents` and splices them in.
+_PAYLOAD_PREFIX, _PAYLOAD_SUFFIX = dumpsJSON(buildRequestPayload("__CONTENTS__")).split(b'"__CONTENTS__"')
+
+
+def buildRequestBody(conversation_api_history: list) -> bytes:
+    """Returns the serialized Gemini request body, byte-for-byte what buildRequestPayload would serialize to."""
+    return _PAYLOAD_PREFIX + dumpsJSON(conversation_api_history) + _PAYLOAD_SUFFIX
+
+
+def estimateRequestTokens(conversation_api_history: list) -> int:
+    """Estimates the input tokens of a request, for the tokens-per-minute limiter."""
+    return estimateTokens(SYSTEM_INSTRUCTION) + sum(
+        estimateTokens(part.get("text", "")) for content in conversation_api_history for part in content["parts"]
+    )
+
+
+def formatHTTPStatusError(e: httpx.HTTPStatusError) -> str:
+    """Maps a non-2xx Gemini response to an ERROR:: message."""
+    recordOutcome("error", e.response.status_code)
+    logEvent("api_http_error", f"HTTPStatusError from Gemini API: {e.response.status_code} - {e.response.text}",
+             level="error", http_status=e.response.status_code)
+    error_details = {}
+    try:
+        error_details = loadsJSON(e.response.content)
+    except Exception:
+        pass
+    error_message_from_api = error_details.get("error", {}).get("message", "No specific error message provided by API.")
+    return f"ERROR::There was an issue with the API (Status {e.response.status_code}): {error_message_from_api}. Please try again later."
+
+
+@dataclass
+class ChatReply:
+    """
+    One bot turn as returned by ChatEngine.
+
+    `status` is "ok", "safety", "blocked" or "error" ("partial" for in-progress streamed
+    text), `source` is "faq", "cache" or "api", and `notice` carries a message to show
+    next to the reply (the API error, or why the answer was adjusted), if any.
+    """
+    text: str
+    status: str = "ok"
+    source: str = "api"
+    notice: str = None
+
+    @property
+    def partial(self) -> bool:
+        return self.status == "partial"
+
+
+def interpretResponse(api_response: str) -> ChatReply:
+    """Maps a tagged API response (ERROR::, SAFETY_WARNING::, BLOCKED_PROMPT:: or plain text) to a ChatReply."""
+    if api_response.startswith("ERROR::"):
+        return ChatReply("Sorry, I encountered a technical problem. Please try again.", "error", notice=api_response.replace("ERROR::", ""))
+    elif api_response.startswith("SAFETY_WARNING::"):
+        return ChatReply(api_response.replace("SAFETY_WARNING::", ""), "safety",
+                         notice="The response was adjusted due to safety guidelines. Some information might be missing.")
+    elif api_response.startswith("BLOCKED_PROMPT::"):
+        return ChatReply("I cannot respond to that query. Please rephrase or ask something else.", "blocked",
+                         notice=api_response.replace("BLOCKED_PROMPT::", ""))
+    return ChatReply(api_response)
+
+
+class ChatEngine:
+    """
+    Headless fitness chatbot: per-session history, FAQ matching, response caching and
+    Gemini calls, with no dependency on Streamlit.
+
+    All coroutines must run on the shared client's event loop, e.g.
+    `getSharedClient().run(engine.chat(session_id, message))`. Turns of one session
+    are not meant to run concurrently with each other.
+    """
+
+    def __init__(self, faq_matcher: FAQMatcher = None, response_cache: ResponseCache = None,
+                 scheduler=None, api_key: str = None, model_url: str = GEMINI_MODEL_URL, session_store: SessionStore = None):
+        self.faq_matcher = faq_matcher or FAQMatcher(loadFAQs())
+        self.response_cache = response_cache or ResponseCache()
+        self._scheduler = scheduler
+        self.api_key = api_key if api_key is not None else GEMINI_API_KEY
+        self.api_url = f"{model_url}:generateContent?key={self.api_key}"
+        self.stream_api_url = f"{model_url}:streamGenerateContent?alt=sse&key={self.api_key}"
+        self.sessions = session_store if session_store is not None else SessionStore()
+
+    @property
+    def scheduler(self):
+        return self._scheduler or getScheduler()
+
+    def history(self, session_id) -> ConversationHistory:
+        """Returns the conversation history for a session, creating it if needed."""
+        return self.sessions.get(session_id).history
+
+    def transcript(self, session_id, limit: int) -> list:
+        """Returns the newest `limit` messages of a session's transcript (Message records, oldest first)."""
+        return self.sessions.recentMessages(session_id, limit)
+
+    async def chat(self, session_id, message: str) -> ChatReply:
+        """Answers one user message in a session, using the blocking generateContent endpoint."""
+        reply, contents, cache_key = await self._prepareTurn(session_id, message)
+        if reply is None:
+            try:
+                api_response = await self.scheduler.coalesce(cache_key, lambda: self.getResponseFromAPI(message, contents))
+                reply = interpretResponse(api_response)
+            except Exception as e:
+                reply = self._failedReply(e)
+        return await self._finishTurn(session_id, cache_key, reply)
+
+    async def chat_stream(self, session_id, message: str):
+        """
+        Answers one user message in a session via streamGenerateContent. Yields partial
+        ChatReply objects as text arrives, then the final ChatReply.
+        """
+        reply, contents, cache_key = await self._prepareTurn(session_id, message)
+        if reply is None:
+            api_response = ""
+            try:
+                async for api_response in self.scheduler.coalesceStream(cache_key, lambda: self.streamResponseFromAPI(message, contents)):
+                    if not api_response.startswith(("ERROR::", "SAFETY_WARNING::", "BLOCKED_PROMPT::")):
+                        yield ChatReply(api_response, "partial")
+                reply = interpretResponse(api_response)
+            except Exception as e:
+                reply = self._failedReply(e)
+        yield await self._finishTurn(session_id, cache_key, reply)
+
+    async def chat_many(self, requests) -> list:
+        """Answers several (session_id, message) pairs concurrently, returning replies in order."""
+        return await asyncio.gather(*(self.chat(session_id, message) for session_id, message in requests))
+
+    def metricLines(self) -> list:
+        """Prometheus lines for the response cache and scheduler counters, for metrics.registerCollector."""
+        stats = self.response_cache.stats()
+        return (
+            counterLines("fitness_chatbot_cache_memory_hits_total", "Response cache hits served from memory.", stats["memory_hits"])
+            + counterLines("fitness_chatbot_cache_disk_hits_total", "Response cache hits served from SQLite.", stats["disk_hits"])
+            + counterLines("fitness_chatbot_cache_misses_total", "Response cache misses.", stats["misses"])
+            + counterLines("fitness_chatbot_api_retries_total", "Gemini calls retried by the scheduler.", self.scheduler.retries)
+            + counterLines("fitness_chatbot_api_coalesced_total", "Requests merged into an identical in-flight call.", self.scheduler.coalesced)
+            + counterLines("fitness_chatbot_sessions_spilled_total", "Sessions spilled from memory to SQLite.", self.sessions.stats()["spilled"])
+        )
+
+    async def _prepareTurn(self, session_id, message: str):
+        PROMPT_CHARS.observe(len(message))
+        history = (await self._offload(self.sessions.add, session_id, "user", message)).history
+
+        with span("faq_lookup"):
+            matched_faq = self.faq_matcher.match(message)
+        if matched_faq:
+            return ChatReply(matched_faq[1], source="faq"), None, None
+
+        with span("cache_lookup"):
+            contents = history.contents()
+            cache_key = makeCacheKey(message, contents, GENERATION_CONFIG)
+            cached_response = await self._offload(self.response_cache.get, cache_key)
+        if cached_response is not None:
+            return ChatReply(cached_response, source="cache"), contents, cache_key
+        return None, contents, cache_key
+
+    async def _finishTurn(self, session_id, cache_key, reply: ChatReply) -> ChatReply:
+        if reply.source == "api" and reply.status == "ok":
+            await self._offload(self.response_cache.put, cache_key, reply.text)
+        await self._offload(self.sessions.add, session_id, "model", reply.text)
+        TURNS.inc(reply.source, reply.status)
+        RESPONSE_CHARS.observe(len(reply.text))
+        return reply
+
+    async def _offload(self, function, *args):
+        # Session spills/loads and cache reads, writes and trims hit SQLite; run them on the
+        # default executor so they never stall the streams of other sessions on the shared loop.
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    def _failedReply(self, e: Exception) -> ChatReply:
+        logEvent("turn_failed", f"An error occurred while getting the bot response: {e}", level="error")
+        return ChatReply("I had trouble processing that. Could you try rephrasing?", "error",
+                         notice=f"An error occurred while getting the bot response: {e}")
+
+    async def getResponseFromAPI(self, user_message: str, conversation_api_history: list) -> str:
+        """
+        Sends the user message and conversation history to the Gemini API
+        and returns the chatbot's response.
+        """
+        if not self.api_key:
+            recordOutcome("error", "no_api_key")
+            return "ERROR::API Key for Gemini is not configured. Please set the GEMINI_API_KEY environment variable."
+
+        with span("payload_build"):
+            payload = buildRequestBody(conversation_api_history)
+
+        try:
+            response = await self.scheduler.post(self.api_url, payload, estimateRequestTokens(conversation_api_history))
+            # elapsed covers only the HTTP exchange; queueing and retries are the scheduler's "admission" stage.
+            STAGE_SECONDS.observe(response.elapsed.total_seconds(), "network")
+            response.raise_for_status()
+            with span("json_decode"):
+                result = loadsJSON(response.content)
+
+            if result.get('candidates') and result['candidates'][0].get('content') and result['candidates'][0]['content'].get('parts'):
+                bot_response_text = result['candidates'][0]['content']['parts'][0]['text']
+                recordOutcome("success", response.status_code)
+                return bot_response_text
+            elif result.get('candidates') and result['candidates'][0].get('finishReason') == 'SAFETY':
+                safety_message = "I'm unable to provide a complete response to that specific query due to safety guidelines."
+                if result['candidates'][0].get('content') and result['candidates'][0]['content'].get('parts'):
+                    safety_message = result['candidates'][0]['content']['parts'][0]['text'] + \
+                                     "\n\n*[Note: This response may have been modified due to safety settings.]*"
+                recordOutcome("safety_warning", response.status_code)
+                return f"SAFETY_WARNING::{safety_message}"
+            elif not result.get('candidates') and result.get('promptFeedback', {}).get('blockReason'):
+                block_reason = result['promptFeedback']['blockReason']
+                recordOutcome("blocked_prompt", response.status_code)
+                return f"BLOCKED_PROMPT::Your request could not be processed because it was blocked: {block_reason}. Please rephrase your message."
+            else:
+                recordOutcome("error", "bad_response")
+                logEvent("api_bad_response", f"Unexpected API response structure or empty candidates: {result}", level="error")
+                return "ERROR::I'm sorry, I couldn't generate a response at this time. (API structure issue or no content)"
+
+        except httpx.RequestError as e:
+            recordOutcome("error", "connection")
+            logEvent("api_connection_error", f"RequestError connecting to Gemini API: {e}", level="error")
+            return f"ERROR::I'm having trouble connecting to my knowledge base. Please check your internet or try again later."
+        except httpx.HTTPStatusError as e:
+            return formatHTTPStatusError(e)
+        except Exception as e:
+            recordOutcome("error", "exception")
+            logEvent("api_exception", f"An unexpected error occurred in API call: {e}", level="error")
+            return "ERROR::I'm having a bit of trouble understanding right now. Could you try rephrasing?"
+
+    async def streamResponseFromAPI(self, user_message: str, conversation_api_history: list):
+        """
+        Streams the chatbot's response from the Gemini streamGenerateContent endpoint (SSE).
+
+        Yields the accumulated response text after every chunk. The last value yielded is the
+        complete response, using the same SAFETY_WARNING::/BLOCKED_PROMPT::/ERROR:: prefixes
+        as getResponseFromAPI.
+        """
+        if not self.api_key:
+            recordOutcome("error", "no_api_key")
+            yield "ERROR::API Key for Gemini is not configured. Please set the GEMINI_API_KEY environment variable."
+            return
+
+        with span("payload_build"):
+            payload = buildRequestBody(conversation_api_history)
+        bot_response_text = ""
+        started = time.perf_counter()
+        decode_seconds = 0.0
+        response = None
+
+        try:
+            async with self.scheduler.stream(self.stream_api_url, payload, estimateRequestTokens(conversation_api_history)) as response:
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    decode_started = time.perf_counter()
+                    chunk = loadsJSON(line[len("data:"):])
+                    decode_seconds += time.perf_counter() - decode_started
+
+                    if not chunk.get('candidates') and chunk.get('promptFeedback', {}).get('blockReason'):
+                        block_reason = chunk['promptFeedback']['blockReason']
+                        recordOutcome("blocked_prompt", response.status_code)
+                        yield f"BLOCKED_PROMPT::Your request could not be processed because it was blocked: {block_reason}. Please rephrase your message."
+                        return
+
+                    candidate = (chunk.get('candidates') or [{}])[0]
+                    had_text = bool(bot_response_text)
+                    for part in candidate.get('content', {}).get('parts', []):
+                        bot_response_text += part.get('text', "")
+                    if bot_response_text and not had_text:
+                        FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+
+                    if candidate.get('finishReason') == 'SAFETY':
+                        safety_message = "I'm unable to provide a complete response to that specific query due to safety guidelines."
+                        if bot_response_text:
+                            safety_message = bot_response_text + \
+                                             "\n\n*[Note: This response may have been modified due to safety settings.]*"
+                        recordOutcome("safety_warning", response.status_code)
+                        yield f"SAFETY_WARNING::{safety_message}"
+                        return
+
+                    if bot_response_text:
+                        yield bot_response_text
+
+            if bot_response_text:
+                recordOutcome("success", response.status_code)
+            else:
+                recordOutcome("error", "bad_response")
+                logEvent("api_bad_response", "Unexpected API response structure or empty candidates in stream.", level="error")
+                yield "ERROR::I'm sorry, I couldn't generate a response at this time. (API structure issue or no content)"
+
+        except httpx.RequestError as e:
+            recordOutcome("error", "connection")
+            logEvent("api_connection_error", f"RequestError connecting to Gemini API: {e}", level="error")
+            yield f"ERROR::I'm having trouble connecting to my knowledge base. Please check your internet or try again later."
+        except httpx.HTTPStatusError as e:
+            yield formatHTTPStatusError(e)
+        except Exception as e:
+            recordOutcome("error", "exception")
+            logEvent("api_exception", f"An unexpected error occurred in streaming API call: {e}", level="error")
+            yield "ERROR::I'm having a bit of trouble understanding right now. Could you try rephrasing?"
+        finally:
+            if response is not None:
+                # The stream is closed here, so elapsed spans the whole exchange, without admission.
+                STAGE_SECONDS.observe(max(0.0, response.elapsed.total_seconds() - decode_seconds), "network")
+            STAGE_SECONDS.observe(decode_seconds, "json_decode")
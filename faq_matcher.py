@@ -0,0 +1,157 @@
+import json
+import math
+import os
+import re
+import zlib
+
+import numpy as np
+
+FAQ_FILE = os.getenv("FITNESS_FAQ_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "faqs.json"))
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.7"))
+FAQ_FEATURE_BITS = int(os.getenv("FAQ_FEATURE_BITS", "18"))
+CHAR_NGRAM_SIZE = 3
+
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+# Words that carry no meaning of their own in a question. Everything else in a prompt,
+# including negations such as "no" and "not", must appear in the matched FAQ question.
+STOP_WORDS = frozenset(
+    "a an the i im me my mine you your we us our it its this that these those what which who whom how when "
+    "where why can could would should will shall do does did am is are was were be been being have has had "
+    "some any for to of in on at by with and or so just really please tell give show help know let there "
+    "about if as".split()
+)
+
+
+def loadFAQs(path: str = FAQ_FILE) -> dict:
+    """Loads the FAQ question -> answer mapping from a JSON file."""
+    with open(path, encoding="utf-8") as faq_file:
+        return json.load(faq_file)
+
+
+def normalizeText(text: str) -> str:
+    """Lowercases text and collapses punctuation and whitespace to single spaces."""
+    return _NON_ALPHANUMERIC.sub(" ", text.lower()).strip()
+
+
+def contentWords(text: str) -> set:
+    """Returns the normalized words of `text` that are not stop words."""
+    return {word for word in normalizeText(text).split() if word not in STOP_WORDS}
+
+
+def _withinOneEdit(a: str, b: str) -> bool:
+    """True if `a` and `b` differ by one insertion, deletion, substitution or adjacent swap."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    prefix = 0
+    while prefix < len(a) and a[prefix] == b[prefix]:
+        prefix += 1
+    if len(a) < len(b):
+        return a[prefix:] == b[prefix + 1:]
+    return (a[prefix + 1:] == b[prefix + 1:]
+            or (prefix + 1 < len(a) and a[prefix] == b[prefix + 1] and a[prefix + 1] == b[prefix] and a[prefix + 2:] == b[prefix + 2:]))
+
+
+def _coveredBy(word: str, question_words: set) -> bool:
+    if word in question_words:
+        return True
+    return len(word) >= 4 and any(len(other) >= 4 and _withinOneEdit(word, other) for other in question_words)
+
+
+class FAQMatcher:
+    """
+    Fuzzy FAQ lookup over hashed word and character n-gram TF-IDF vectors.
+
+    Similarity alone lets shared phrasing ("what should i eat ... workout") outweigh the
+    one word that changes the meaning ("not", "drink", "before bed"), so a match must also
+    cover every content word of the prompt: each one has to appear in the FAQ question,
+    allowing a single typo or plural ending in words of four letters or more.
+
+    The FAQ vectors are precomputed once into an inverted index (CSR layout: one
+    posting list per hashed feature), so scoring a prompt is a single weighted
+    np.bincount over the postings of the prompt's features. Cost grows with the
+    number of FAQs sharing a feature with the prompt, not with the FAQ set size.
+    """
+
+    def __init__(self, faqs: dict, threshold: float = FAQ_MATCH_THRESHOLD, feature_bits: int = FAQ_FEATURE_BITS):
+        self.questions = list(faqs.keys())
+        self.answers = list(faqs.values())
+        self.threshold = threshold
+        self._feature_mask = (1 << feature_bits) - 1
+        self._exact = {normalizeText(question): i for i, question in enumerate(self.questions)}
+        self._content_words = [contentWords(question) for question in self.questions]
+
+        doc_features = [self._featureCounts(question) for question in self.questions]
+        doc_ids = np.concatenate([np.full(len(f), i, dtype=np.int32) for i, (f, _) in enumerate(doc_features)] or [np.empty(0, np.int32)])
+        features = np.concatenate([f for f, _ in doc_features] or [np.empty(0, np.int64)])
+        counts = np.concatenate([c for _, c in doc_features] or [np.empty(0, np.float32)])
+
+        # Smoothed IDF over the hashed feature space, stored only for features that occur.
+        self._vocabulary, document_frequency = np.unique(features, return_counts=True)
+        self._idf = (np.log((1 + len(self.questions)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        weights = counts * self._idf[np.searchsorted(self._vocabulary, features)]
+        norms = np.sqrt(np.bincount(doc_ids, weights=weights * weights, minlength=len(self.questions)))
+        weights = weights / norms[doc_ids]
+
+        order = np.argsort(features, kind="stable")
+        self._posting_docs = doc_ids[order]
+        self._posting_weights = weights[order].astype(np.float32)
+        self._posting_offsets = np.searchsorted(features[order], self._vocabulary).astype(np.int64)
+        self._posting_offsets = np.append(self._posting_offsets, len(features))
+
+    def _featureCounts(self, text: str):
+        normalized = normalizeText(text)
+        tokens = normalized.split()
+        padded = f" {normalized} "
+        grams = [f"w:{token}" for token in tokens]
+        grams += [padded[i:i + CHAR_NGRAM_SIZE] for i in range(len(padded) - CHAR_NGRAM_SIZE + 1)]
+        hashed = np.fromiter((zlib.crc32(gram.encode()) & self._feature_mask for gram in grams), dtype=np.int64, count=len(grams))
+        features, counts = np.unique(hashed, return_counts=True)
+        return features, (1 + np.log(counts)).astype(np.float32)
+
+    def scores(self, prompt: str) -> np.ndarray:
+        """Returns the cosine similarity of the prompt against every FAQ question."""
+        features, counts = self._featureCounts(prompt)
+        positions = np.searchsorted(self._vocabulary, features)
+        known = positions < len(self._vocabulary)
+        known[known] = self._vocabulary[positions[known]] == features[known]
+        if not known.any():
+            return np.zeros(len(self.questions), dtype=np.float32)
+
+        # Features no FAQ contains still count towards the prompt's norm, at the maximum IDF.
+        unseen_idf = math.log(1 + len(self.questions)) + 1
+        unseen_weights = counts[~known] * unseen_idf
+        positions, counts = positions[known], counts[known]
+        query_weights = counts * self._idf[positions]
+        query_norm = math.sqrt(float(np.dot(query_weights, query_weights)) + float(np.dot(unseen_weights, unseen_weights)))
+
+        starts = self._posting_offsets[positions]
+        lengths = self._posting_offsets[positions + 1] - starts
+        postings = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.bincount(
+            self._posting_docs[postings],
+            weights=self._posting_weights[postings] * np.repeat(query_weights / query_norm, lengths),
+            minlength=len(self.questions),
+        )
+
+    def match(self, prompt: str):
+        """
+        Returns (question, answer, score) for the best FAQ above the confidence
+        threshold that covers the prompt's content words, or None if no FAQ is close enough.
+        """
+        exact_index = self._exact.get(normalizeText(prompt))
+        if exact_index is not None:
+            return self.questions[exact_index], self.answers[exact_index], 1.0
+        if not self.questions:
+            return None
+        scores = self.scores(prompt)
+        prompt_words = contentWords(prompt)
+        for index in np.argsort(-scores, kind="stable"):
+            if scores[index] < self.threshold:
+                break
+            if all(_coveredBy(word, self._content_words[index]) for word in prompt_words):
+                return self.questions[index], self.answers[index], float(scores[index])
+        return None
@@ -0,0 +1,26 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+if orjson is not None:
+    def dumpsJSON(obj) -> bytes:
+        """Serializes `obj` to compact UTF-8 JSON bytes."""
+        return orjson.dumps(obj)
+
+    def loadsJSON(data):
+        """Parses JSON from bytes or str."""
+        return orjson.loads(data)
+else:
+    def dumpsJSON(obj) -> bytes:
+        """Serializes `obj` to compact UTF-8 JSON bytes."""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def loadsJSON(data):
+        """Parses JSON from bytes or str."""
+        return json.loads(data)
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import queue
+import threading
+
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("GEMINI_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GEMINI_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("GEMINI_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("GEMINI_HTTP_READ_TIMEOUT", "90"))
+HTTP_WRITE_TIMEOUT = float(os.getenv("GEMINI_HTTP_WRITE_TIMEOUT", "30"))
+HTTP_POOL_TIMEOUT = float(os.getenv("GEMINI_HTTP_POOL_TIMEOUT", "30"))
+HTTP2_ENABLED = os.getenv("GEMINI_HTTP2", "1") not in ("0", "false", "False")
+
+
+class SharedAsyncClient:
+    """
+    A process-wide httpx.AsyncClient that lives on its own background event loop.
+
+    Streamlit reruns the script on a fresh thread for every interaction, so each
+    session submits its coroutines here instead of creating (and closing) an event
+    loop per message. Connections stay pooled and kept alive between turns.
+    """
+
+    def __init__(self, limits: httpx.Limits = None, timeout: httpx.Timeout = None, http2: bool = HTTP2_ENABLED):
+        self.limits = limits or httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = timeout or httpx.Timeout(
+            connect=HTTP_CONNECT_TIMEOUT,
+            read=HTTP_READ_TIMEOUT,
+            write=HTTP_WRITE_TIMEOUT,
+            pool=HTTP_POOL_TIMEOUT,
+        )
+        self.http2 = http2
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._runLoop, name="gemini-http-loop", daemon=True)
+        self._thread.start()
+        self.client = self.run(self._createClient())
+
+    def _runLoop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _createClient(self) -> httpx.AsyncClient:
+        # Created on the background loop so the connection pool is bound to it.
+        try:
+            return httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout)
+        except ImportError:
+            # The optional `h2` package is missing; fall back to pooled HTTP/1.1.
+            self.http2 = False
+            return httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+
+    def submit(self, coro):
+        """Schedules a coroutine on the background loop and returns a concurrent.futures.Future."""
+        if self.loop.is_closed():
+            raise RuntimeError("Shared HTTP client has been closed.")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: float = None):
+        """Runs a coroutine on the background loop and blocks the calling thread for its result."""
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen):
+        """
+        Drives an async generator on the background loop and yields its items
+        synchronously, so the Streamlit script thread can render them as they arrive.
+        """
+        items = queue.Queue()
+        finished = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put((item, None))
+            except BaseException as e:
+                items.put((finished, e))
+                raise
+            items.put((finished, None))
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item, error = items.get()
+                if item is finished:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        self.run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self.loop.close()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def getSharedClient() -> SharedAsyncClient:
+    """Returns the process-wide SharedAsyncClient, creating it on first use."""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = SharedAsyncClient()
+    return _shared_client
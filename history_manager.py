@@ -0,0 +1,147 @@
+import math
+import os
+import re
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("HISTORY_SUMMARY_TOKEN_BUDGET", "400"))
+CHARS_PER_TOKEN = 4
+
+# User turns mentioning any of these are kept in more detail when folded into the summary.
+_IMPORTANT_CONTEXT = re.compile(
+    r"\b(injur\w*|pain\w*|hurt\w*|surgery|condition|pregnan\w*|diabet\w*|asthma|allerg\w*|"
+    r"blood pressure|heart|knee|back|shoulder|ankle|hip|wrist|doctor|medication|goal\w*|"
+    r"vegan|vegetarian|intoleran\w*|beginner|age|years old|weigh\w*)\b",
+    re.IGNORECASE,
+)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+_SUMMARY_HEADER = "Summary of our earlier conversation:"
+_SUMMARY_ACK = "Understood. I'll keep this earlier context in mind."
+
+
+class Message:
+    """One chat message. The transcript and the history share these records, so each text is stored once."""
+    __slots__ = ("role", "text")
+
+    def __init__(self, role: str, text: str):
+        self.role = role
+        self.text = text
+
+    def toContent(self) -> dict:
+        """Gemini `contents` entry for this message."""
+        return {"role": self.role, "parts": [{"text": self.text}]}
+
+
+def estimateTokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token for English text)."""
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def _clip(text: str, max_chars: int, first_sentence_only: bool = True) -> str:
+    text = " ".join(text.split())
+    if first_sentence_only:
+        text = _SENTENCE_END.split(text, maxsplit=1)[0]
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+class ConversationHistory:
+    """
+    Conversation history for the Gemini `contents` field, kept within a token budget.
+
+    Recent turns are kept as Message records and converted to Gemini `contents` dicts
+    only when contents() is called. They are sent verbatim; once they exceed `token_budget`, the oldest turns
+    are folded one at a time into a compact rolling summary, which is sent ahead of
+    them. Folding only appends to the summary, so it is never rebuilt from scratch;
+    when the summary (with its header and acknowledgement) outgrows `summary_budget`,
+    its oldest routine lines are dropped before any line that records important
+    context such as injuries or goals.
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, summary_budget: int = SUMMARY_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.turns = []
+        self.summary_lines = []
+        self._turn_tokens = []
+        self._turn_total = 0
+        self._summary_total = 0
+
+    def __len__(self):
+        return len(self.turns)
+
+    def append(self, role: str, text: str) -> Message:
+        """Adds a turn ("user" or "model") and folds older turns if over budget."""
+        message = Message(role, text)
+        self.appendMessage(message)
+        return message
+
+    def appendMessage(self, message: Message):
+        """Adds an existing Message record as the newest turn."""
+        self.turns.append(message)
+        tokens = estimateTokens(message.text)
+        self._turn_tokens.append(tokens)
+        self._turn_total += tokens
+        self._compact()
+
+    def contents(self) -> list:
+        """Returns the Gemini `contents` list: the summary (if any) followed by the recent turns."""
+        contents = [message.toContent() for message in self.turns]
+        if not self.summary_lines:
+            return contents
+        summary = _SUMMARY_HEADER + "".join("\n" + line for line, _, _ in self.summary_lines)
+        return [
+            {"role": "user", "parts": [{"text": summary}]},
+            {"role": "model", "parts": [{"text": _SUMMARY_ACK}]},
+        ] + contents
+
+    def tokenCount(self) -> int:
+        """Estimated tokens of everything returned by contents(), including the summary's header and acknowledgement."""
+        return self._turn_total + self._summaryTokens()
+
+    def toState(self) -> dict:
+        """
+        JSON-serializable state for spilling to disk. Turns are stored as a count: they
+        are always the newest messages of the session transcript they were appended with.
+        """
+        return {"turn_count": len(self.turns), "summary_lines": [list(line) for line in self.summary_lines]}
+
+    @classmethod
+    def fromState(cls, state: dict, transcript: list, **kwargs):
+        """Rebuilds a history from toState() output and the tail of its transcript."""
+        history = cls(**kwargs)
+        turn_count = state["turn_count"]
+        history.turns = list(transcript[len(transcript) - turn_count:]) if turn_count else []
+        history._turn_tokens = [estimateTokens(message.text) for message in history.turns]
+        history._turn_total = sum(history._turn_tokens)
+        history.summary_lines = [tuple(line) for line in state["summary_lines"]]
+        history._summary_total = sum(tokens for _, tokens, _ in history.summary_lines)
+        return history
+
+    def _summaryTokens(self) -> int:
+        if not self.summary_lines:
+            return 0
+        return estimateTokens(_SUMMARY_HEADER) + estimateTokens(_SUMMARY_ACK) + self._summary_total
+
+    def _compact(self):
+        # The newest turn is always sent verbatim, and the verbatim turns must start with a user turn.
+        while len(self.turns) > 1 and (self._turn_total > self.token_budget or self.turns[0].role != "user"):
+            self._fold(self.turns.pop(0), self._turn_tokens.pop(0))
+
+    def _fold(self, turn: Message, tokens: int):
+        self._turn_total -= tokens
+        text = turn.text
+        important = turn.role == "user" and bool(_IMPORTANT_CONTEXT.search(text))
+        if turn.role == "user":
+            line = "- User: " + (_clip(text, 300, first_sentence_only=False) if important else _clip(text, 160))
+        else:
+            line = "- Bot: " + _clip(text, 120)
+        # Counted with its joining newline, so the lines' tokens add up to at least the summary text's.
+        line_tokens = estimateTokens("\n" + line)
+        self.summary_lines.append((line, line_tokens, important))
+        self._summary_total += line_tokens
+
+        while self._summaryTokens() > self.summary_budget and len(self.summary_lines) > 1:
+            drop_index = next((i for i, (_, _, keep) in enumerate(self.summary_lines) if not keep), 0)
+            _, dropped_tokens, _ = self.summary_lines.pop(drop_index)
+            self._summary_total -= dropped_tokens
@@ -0,0 +1,188 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+JSON_LOGS = os.getenv("JSON_LOGS", "0") not in ("0", "false", "False")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+
+
+def _formatLabels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items(), key=lambda item: tuple(map(str, item[0])))
+        lines += [f"{self.name}{_formatLabels(self.label_names, labels)} {value:g}" for labels, value in items]
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels; observe() is one bisect and three increments."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def total(self, *label_values) -> float:
+        series = self._series.get(label_values)
+        return series[1] if series else 0.0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(((labels, (list(series[0]), series[1], series[2])) for labels, series in self._series.items()),
+                           key=lambda item: tuple(map(str, item[0])))
+        for labels, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_formatLabels(self.label_names, labels, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_formatLabels(self.label_names, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_formatLabels(self.label_names, labels)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("fitness_chatbot_stage_seconds", "Time spent in each stage of a chat turn.", label_names=("stage",))
+FIRST_TOKEN_SECONDS = Histogram("fitness_chatbot_first_token_seconds", "Time from sending a streamed request to its first text chunk.")
+API_OUTCOMES = Counter("fitness_chatbot_api_outcomes_total", "Gemini calls by outcome and HTTP status.", ("outcome", "http_status"))
+TURNS = Counter("fitness_chatbot_turns_total", "Chat turns by where the answer came from and its status.", ("source", "status"))
+PROMPT_CHARS = Histogram("fitness_chatbot_prompt_chars", "Size of user prompts in characters.", SIZE_BUCKETS)
+RESPONSE_CHARS = Histogram("fitness_chatbot_response_chars", "Size of bot responses in characters.", SIZE_BUCKETS)
+
+REGISTRY = [STAGE_SECONDS, FIRST_TOKEN_SECONDS, API_OUTCOMES, TURNS, PROMPT_CHARS, RESPONSE_CHARS]
+
+
+@contextmanager
+def span(stage: str):
+    """Times the enclosed block into fitness_chatbot_stage_seconds{stage=...}."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+
+def recordOutcome(outcome: str, http_status="none"):
+    """Counts one Gemini call outcome: success, safety_warning, blocked_prompt or error."""
+    API_OUTCOMES.inc(outcome, str(http_status))
+
+
+def logEvent(event: str, message: str, level: str = "info", **fields):
+    """
+    Logs a hot-path event. With JSON_LOGS enabled it writes one JSON object per line
+    to stdout; otherwise it prints `message` as before.
+    """
+    if JSON_LOGS:
+        record = {"ts": round(time.time(), 3), "level": level, "event": event, "message": message}
+        record.update(fields)
+        sys.stdout.write(json.dumps(record, default=str) + "\n")
+        sys.stdout.flush()
+    else:
+        print(message)
+
+
+def renderPrometheus(extra_collectors=()) -> str:
+    """Renders every registered metric (plus the lines from `extra_collectors`) in Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    for collector in extra_collectors:
+        lines += collector()
+    return "\n".join(lines) + "\n"
+
+
+_extra_collectors = []
+
+
+def counterLines(name: str, help_text: str, value: float) -> list:
+    """Prometheus text lines for a single unlabelled counter kept outside the registry."""
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value:g}"]
+
+
+def registerCollector(collector):
+    """Adds a callable returning extra Prometheus text lines (e.g. cache gauges) to /metrics."""
+    _extra_collectors.append(collector)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = renderPrometheus(_extra_collectors).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def startMetricsServer(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Serves /metrics on a background thread, once per process. Does nothing if port is 0."""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
@@ -0,0 +1,282 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from fast_json import loadsJSON
+from gemini_client import getSharedClient
+from metrics import STAGE_SECONDS
+
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "2000"))
+GEMINI_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "4000000"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "20"))
+GEMINI_RETRY_AFTER_MAX = float(os.getenv("GEMINI_RETRY_AFTER_MAX", "300"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_RETRY_DELAY = re.compile(r"^\s*([\d.]+)s\s*$")
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `per_minute` tokens per minute."""
+
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1):
+        """Waits until `amount` tokens are available and takes them (FIFO across callers)."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class _SharedStream:
+    """
+    Fans the accumulated text of one in-flight streamed response out to coalesced followers.
+    `completed` is set only when the leader exhausted its stream, not when it was cancelled
+    or failed part-way.
+    """
+
+    def __init__(self):
+        self.latest = None
+        self.version = 0
+        self.done = False
+        self.completed = False
+        self._condition = asyncio.Condition()
+
+    async def publish(self, item):
+        async with self._condition:
+            self.latest = item
+            self.version += 1
+            self._condition.notify_all()
+
+    async def finish(self):
+        async with self._condition:
+            self.done = True
+            self._condition.notify_all()
+
+    async def follow(self):
+        seen = 0
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self.version > seen or self.done)
+                version, latest = self.version, self.latest
+            if version > seen:
+                seen = version
+                yield latest
+            else:
+                return
+
+
+def retryAfterSeconds(response: httpx.Response):
+    """
+    Returns the server-requested retry delay in seconds from a Retry-After header
+    (delta-seconds or HTTP date) or a Gemini RetryInfo error detail, or None.
+    """
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    try:
+        details = loadsJSON(response.content).get("error", {}).get("details", [])
+    except Exception:
+        return None
+    for detail in details:
+        match = _RETRY_DELAY.match(str(detail.get("retryDelay", "")))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class RequestScheduler:
+    """
+    Admission control for outbound Gemini calls, shared by every session in the process.
+
+    Each attempt waits for a slot under a global concurrency cap and for capacity in the
+    requests-per-minute and tokens-per-minute buckets. 429 and 5xx responses and transport
+    errors are retried with exponential backoff and full jitter, honoring Retry-After; a 429
+    also pauses admission for every other caller until the requested delay has passed.
+    Identical in-flight requests can be coalesced into one call with coalesce() and
+    coalesceStream().
+
+    Must be used from the shared client's background event loop.
+    """
+
+    def __init__(self, client: httpx.AsyncClient = None, max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+                 requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE, tokens_per_minute: float = GEMINI_TOKENS_PER_MINUTE,
+                 max_retries: int = GEMINI_MAX_RETRIES, backoff_base: float = GEMINI_BACKOFF_BASE, backoff_max: float = GEMINI_BACKOFF_MAX,
+                 retry_after_max: float = GEMINI_RETRY_AFTER_MAX):
+        self._client = client
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.retries = 0
+        self.coalesced = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self._in_flight = {}
+        self._in_flight_streams = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or getSharedClient().client
+
+    async def post(self, url: str, payload, estimated_tokens: int = 0) -> httpx.Response:
+        """
+        POSTs `payload` (a dict, or an already serialized JSON body as bytes) with
+        admission control and retries, returning the final response.
+        Non-retryable or exhausted error responses are returned as-is for the caller to raise.
+        """
+        async with self._send(url, payload, estimated_tokens, stream=False) as response:
+            return response
+
+    @asynccontextmanager
+    async def stream(self, url: str, payload, estimated_tokens: int = 0):
+        """Like post(), but yields a streaming response; the concurrency slot is held until it closes."""
+        async with self._send(url, payload, estimated_tokens, stream=True) as response:
+            yield response
+
+    async def coalesce(self, key, factory):
+        """Awaits `factory()`, sharing one call among concurrent callers with the same key."""
+        if key is None:
+            return await factory()
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def coalesceStream(self, key, factory):
+        """
+        Iterates the async generator returned by `factory()`, sharing one stream among
+        concurrent callers with the same key. Items must be cumulative (each one
+        supersedes the last), since followers may skip intermediate items. If the
+        leading caller stops before its stream is complete, followers start over with
+        their own call (coalescing again among themselves).
+        """
+        if key is None:
+            async for item in factory():
+                yield item
+            return
+        shared = self._in_flight_streams.get(key)
+        if shared is not None:
+            self.coalesced += 1
+            async for item in shared.follow():
+                yield item
+            if not shared.completed:
+                async for item in self.coalesceStream(key, factory):
+                    yield item
+            return
+
+        shared = _SharedStream()
+        self._in_flight_streams[key] = shared
+        try:
+            async for item in factory():
+                await shared.publish(item)
+                yield item
+            shared.completed = True
+        finally:
+            self._in_flight_streams.pop(key, None)
+            await shared.finish()
+
+    @asynccontextmanager
+    async def _send(self, url: str, payload, estimated_tokens: int, stream: bool):
+        # Everything before the last attempt is sent (slot and bucket waits, 429 pauses, failed
+        # attempts and backoff sleeps) is reported as the "admission" stage, not as network time.
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            delay = None
+            async with self._semaphore:
+                await self._waitForAdmission(estimated_tokens)
+                admitted = time.perf_counter()
+                try:
+                    if isinstance(payload, bytes):
+                        request = self.client.build_request("POST", url, content=payload, headers=_JSON_HEADERS)
+                    else:
+                        request = self.client.build_request("POST", url, json=payload)
+                    response = await self.client.send(request, stream=stream)
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        STAGE_SECONDS.observe(admitted - started, "admission")
+                        raise
+                    delay = self._backoff(attempt)
+                else:
+                    if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                        STAGE_SECONDS.observe(admitted - started, "admission")
+                        try:
+                            yield response
+                        finally:
+                            await response.aclose()
+                        return
+                    if stream:
+                        await response.aread()
+                    retry_after = retryAfterSeconds(response)
+                    await response.aclose()
+                    # A server-requested delay is honored as-is (quota 429s often ask for 30-60 s); the
+                    # separate, much larger cap only guards against absurd Retry-After values.
+                    delay = min(retry_after, self.retry_after_max) if retry_after is not None else self._backoff(attempt)
+                    if response.status_code == 429:
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def _waitForAdmission(self, estimated_tokens: int):
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        await self._request_bucket.acquire(1)
+        if estimated_tokens:
+            await self._token_bucket.acquire(estimated_tokens)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)].
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def getScheduler() -> RequestScheduler:
+    """Returns the process-wide RequestScheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler()
+    return _scheduler
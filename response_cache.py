@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from faq_matcher import normalizeText
+
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "response_cache.sqlite3"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", "512"))
+RESPONSE_CACHE_DISK_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_ENTRIES", "20000"))
+
+
+def makeCacheKey(prompt: str, contents: list, generation_config: dict) -> str:
+    """
+    Builds a cache key from the normalized prompt, a digest of the preceding
+    conversation window and the generation config. The prompt's own turn is
+    expected to be the last entry of `contents` and is keyed by its normalized
+    form instead, so trivially different spellings share an entry.
+    """
+    context = contents[:-1] if contents and contents[-1].get("role") == "user" else contents
+    digest = hashlib.sha256()
+    digest.update(normalizeText(prompt).encode())
+    digest.update(b"\0")
+    digest.update(json.dumps(context, sort_keys=True, separators=(",", ":")).encode())
+    digest.update(b"\0")
+    digest.update(json.dumps(generation_config, sort_keys=True, separators=(",", ":")).encode())
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of chatbot responses: an in-memory LRU in front of a SQLite
+    file, both expiring entries after `ttl` seconds. The SQLite tier survives
+    process restarts and is trimmed to `max_disk_entries` by least recent use.
+    """
+
+    def __init__(self, path: str = RESPONSE_CACHE_PATH, ttl: float = RESPONSE_CACHE_TTL_SECONDS,
+                 max_memory_entries: int = RESPONSE_CACHE_MEMORY_ENTRIES, max_disk_entries: int = RESPONSE_CACHE_DISK_ENTRIES):
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self._touched = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._trim()
+
+    def get(self, key: str):
+        """Returns the cached response for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    self._touch(key, now)
+                    return response
+                del self._memory[key]
+
+            row = self._db.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """Stores a response in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._writes_since_trim += 1
+            if self._writes_since_trim >= 100:
+                self._trim()
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current number of in-memory entries."""
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            self._flushTouched()
+            self._db.close()
+
+    def _remember(self, key: str, response: str, created_at: float):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _touch(self, key: str, now: float):
+        # Memory hits must keep their SQLite row recent too, or the disk tier would trim the
+        # hottest answers first. Their access times are written in batches.
+        self._touched[key] = now
+        if len(self._touched) >= 100:
+            self._flushTouched()
+
+    def _flushTouched(self):
+        if self._touched:
+            self._db.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?",
+                                 [(accessed_at, key) for key, accessed_at in self._touched.items()])
+            self._touched.clear()
+
+    def _trim(self):
+        """Drops expired rows and the least recently used rows beyond the disk limit."""
+        self._flushTouched()
+        self._writes_since_trim = 0
+        self._db.execute("DELETE FROM responses WHERE created_at <= ?", (time.time() - self.ttl,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
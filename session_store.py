@@ -0,0 +1,199 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from history_manager import ConversationHistory, Message
+
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.sqlite3"))
+SESSION_MAX_ACTIVE = int(os.getenv("SESSION_MAX_ACTIVE", "1000"))
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+SESSION_TRANSCRIPT_CAP = int(os.getenv("SESSION_TRANSCRIPT_CAP", "100"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+class Session:
+    """
+    One chat session: the newest transcript messages and the conversation history.
+
+    The history's turns are the same Message records as the tail of `messages`, so each
+    text is held once. Messages beyond the transcript cap are archived to SQLite by the
+    store; `archived` counts them.
+    """
+    __slots__ = ("session_id", "messages", "history", "archived", "last_access")
+
+    def __init__(self, session_id: str, messages: list = None, history: ConversationHistory = None, archived: int = 0):
+        self.session_id = session_id
+        self.messages = messages if messages is not None else []
+        self.history = history if history is not None else ConversationHistory()
+        self.archived = archived
+        self.last_access = time.monotonic()
+
+    def add(self, role: str, text: str) -> Message:
+        """Appends a message to the transcript and the conversation history."""
+        message = Message(role, text)
+        self.messages.append(message)
+        self.history.appendMessage(message)
+        return message
+
+    @property
+    def total_messages(self) -> int:
+        return self.archived + len(self.messages)
+
+
+class SessionStore:
+    """
+    Process-wide store of chat sessions with bounded memory.
+
+    At most `max_active` sessions are kept in memory (LRU). Sessions that are evicted, or
+    idle for `idle_seconds`, are spilled to SQLite and loaded back on their next access.
+    Each in-memory transcript keeps at most `transcript_cap` messages (never fewer than
+    the history's verbatim turns); older ones are moved to an archive table and remain
+    reachable through recentMessages() for pagination. Spilled sessions expire after `ttl`.
+    """
+
+    def __init__(self, path: str = SESSION_STORE_PATH, max_active: int = SESSION_MAX_ACTIVE,
+                 idle_seconds: float = SESSION_IDLE_SECONDS, transcript_cap: int = SESSION_TRANSCRIPT_CAP,
+                 ttl: float = SESSION_TTL_SECONDS):
+        self.max_active = max_active
+        self.idle_seconds = idle_seconds
+        self.transcript_cap = transcript_cap
+        self.ttl = ttl
+        self.spilled = 0
+        self.loaded = 0
+        self._active = OrderedDict()
+        self._lock = threading.RLock()
+        self._accesses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS archived_messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, text TEXT NOT NULL, PRIMARY KEY (session_id, seq))"
+        )
+        self._purgeExpired()
+
+    def __len__(self):
+        return len(self._active)
+
+    def get(self, session_id: str) -> Session:
+        """Returns the session, loading it from disk or creating it as needed."""
+        with self._lock:
+            session = self._active.get(session_id)
+            if session is None:
+                session = self._load(session_id) or Session(session_id)
+                self._active[session_id] = session
+            else:
+                self._active.move_to_end(session_id)
+            session.last_access = time.monotonic()
+            self._accesses += 1
+            self._evict()
+            return session
+
+    def add(self, session_id: str, role: str, text: str) -> Session:
+        """Appends a message to a session and archives transcript overflow."""
+        with self._lock:
+            session = self.get(session_id)
+            session.add(role, text)
+            self._archiveOverflow(session)
+            return session
+
+    def recentMessages(self, session_id: str, limit: int) -> list:
+        """Returns the newest `limit` messages of a session, oldest first, reading the archive if needed."""
+        with self._lock:
+            session = self.get(session_id)
+            messages = session.messages[-limit:] if limit else []
+            missing = limit - len(messages)
+            if missing > 0 and session.archived:
+                rows = self._db.execute(
+                    "SELECT role, text FROM archived_messages WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                    (session_id, max(0, session.archived - missing)),
+                ).fetchall()
+                messages = [Message(role, text) for role, text in rows] + messages
+            return messages
+
+    def totalMessages(self, session_id: str) -> int:
+        with self._lock:
+            return self.get(session_id).total_messages
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"active": len(self._active), "spilled": self.spilled, "loaded": self.loaded}
+
+    def flush(self):
+        """Spills every active session to disk (e.g. on shutdown)."""
+        with self._lock:
+            while self._active:
+                _, session = self._active.popitem(last=False)
+                self._spill(session)
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._db.close()
+
+    def _evict(self):
+        while len(self._active) > self.max_active:
+            _, session = self._active.popitem(last=False)
+            self._spill(session)
+        # Idle sweeps walk the LRU order from the oldest end, so they stop at the first recent session.
+        if self._accesses % 100 == 0:
+            cutoff = time.monotonic() - self.idle_seconds
+            while self._active:
+                session = next(iter(self._active.values()))
+                if session.last_access >= cutoff:
+                    break
+                self._active.popitem(last=False)
+                self._spill(session)
+            self._purgeExpired()
+
+    def _archiveOverflow(self, session: Session):
+        keep = max(self.transcript_cap, len(session.history.turns))
+        overflow = len(session.messages) - keep
+        if overflow <= 0:
+            return
+        archived = session.messages[:overflow]
+        self._db.executemany(
+            "INSERT OR REPLACE INTO archived_messages (session_id, seq, role, text) VALUES (?, ?, ?, ?)",
+            [(session.session_id, session.archived + i, message.role, message.text) for i, message in enumerate(archived)],
+        )
+        del session.messages[:overflow]
+        session.archived += overflow
+
+    def _spill(self, session: Session):
+        data = {
+            "messages": [[message.role, message.text] for message in session.messages],
+            "history": session.history.toState(),
+            "archived": session.archived,
+        }
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+            (session.session_id, json.dumps(data, separators=(",", ":")), time.time()),
+        )
+        self.spilled += 1
+
+    def _load(self, session_id: str):
+        row = self._db.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        messages = [Message(role, text) for role, text in data["messages"]]
+        history = ConversationHistory.fromState(data["history"], messages)
+        self.loaded += 1
+        return Session(session_id, messages, history, data["archived"])
+
+    def _purgeExpired(self):
+        cutoff = time.time() - self.ttl
+        # Sessions that are active again keep their archive; their row is rewritten on the next spill.
+        expired = [row[0] for row in self._db.execute("SELECT session_id FROM sessions WHERE updated_at <= ?", (cutoff,))
+                   if row[0] not in self._active]
+        if expired:
+            self._db.executemany("DELETE FROM archived_messages WHERE session_id = ?", [(session_id,) for session_id in expired])
+            self._db.executemany("DELETE FROM sessions WHERE session_id = ?", [(session_id,) for session_id in expired])
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_gemini import FakeGeminiConfig, modelURL, startFakeGemini
+from chat_engine import ChatEngine
+from gemini_client import getSharedClient
+from request_scheduler import RequestScheduler
+from response_cache import ResponseCache
+from session_store import SessionStore
+
+
+class ScriptedConfig(FakeGeminiConfig):
+    """Fake server behaviour that answers with the given outcomes in order, then "ok"."""
+
+    def __init__(self, outcomes=(), **kwargs):
+        super().__init__(**kwargs)
+        self.script = list(outcomes)
+
+    def outcome(self) -> str:
+        with self._lock:
+            self.requests += 1
+            return self.script.pop(0) if self.script else "ok"
+
+
+def runOnLoop(coro):
+    """Runs a coroutine on the shared client's event loop, where the engine and scheduler live."""
+    return getSharedClient().run(coro, timeout=30)
+
+
+def collect(agen) -> list:
+    """Drains an async generator on the shared loop and returns its items."""
+    async def drain():
+        return [item async for item in agen]
+    return runOnLoop(drain())
+
+
+@pytest.fixture
+def fakeGemini():
+    """Starts fake Gemini servers: fakeGemini(outcomes, **config) -> server."""
+    servers = []
+
+    def start(outcomes=(), latency: float = 0.1, first_token_latency: float = 0.02, **kwargs):
+        config = ScriptedConfig(outcomes, latency=latency, jitter=0.0, first_token_latency=first_token_latency, **kwargs)
+        server = startFakeGemini(config)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def makeEngine(tmp_path):
+    """Builds a ChatEngine against a fake server, with its cache and sessions under tmp_path."""
+    engines = []
+
+    def make(server, session_options: dict = None, **scheduler_kwargs):
+        scheduler_kwargs.setdefault("backoff_base", 0.01)
+        engine = ChatEngine(
+            response_cache=ResponseCache(str(tmp_path / f"responses-{len(engines)}.sqlite3")),
+            scheduler=runOnLoop(_createScheduler(scheduler_kwargs)),
+            api_key="fake",
+            model_url=modelURL(server),
+            session_store=SessionStore(str(tmp_path / f"sessions-{len(engines)}.sqlite3"), **(session_options or {})),
+        )
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.response_cache.close()
+        engine.sessions.close()
+
+
+async def _createScheduler(kwargs: dict) -> RequestScheduler:
+    return RequestScheduler(**kwargs)
@@ -0,0 +1,34 @@
+import threading
+
+from conftest import runOnLoop
+from gemini_client import getSharedClient
+
+PROMPTS = ["Plan a deadlift progression", "Suggest a weekly running plan", "Is it okay to train when sore?"]
+
+
+def test_injectedSessionStoreIsUsed(fakeGemini, makeEngine):
+    engine = makeEngine(fakeGemini(), session_options={"max_active": 2})
+    runOnLoop(engine.chat_many([(f"s{i}", PROMPTS[i % len(PROMPTS)]) for i in range(5)]))
+
+    stats = engine.sessions.stats()
+    assert stats["active"] == 2 and stats["spilled"] >= 3
+    assert [message.role for message in engine.transcript("s0", 10)] == ["user", "model"]
+
+
+def test_storeWorkRunsOffTheEventLoop(fakeGemini, makeEngine, monkeypatch):
+    engine = makeEngine(fakeGemini(), session_options={"max_active": 1})
+    threads = []
+    for store, name in ((engine.sessions, "_spill"), (engine.sessions, "_load"), (engine.response_cache, "_trim")):
+        original = getattr(store, name)
+
+        def recorded(*args, original=original):
+            threads.append(threading.current_thread())
+            return original(*args)
+        monkeypatch.setattr(store, name, recorded)
+    engine.response_cache._writes_since_trim = 99
+
+    runOnLoop(engine.chat("a", PROMPTS[0]))
+    runOnLoop(engine.chat("b", PROMPTS[1]))
+    runOnLoop(engine.chat("a", PROMPTS[2]))
+
+    assert threads and getSharedClient()._thread not in threads
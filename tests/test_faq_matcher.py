@@ -0,0 +1,40 @@
+import pytest
+
+from faq_matcher import FAQMatcher, loadFAQs
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return FAQMatcher(loadFAQs())
+
+
+@pytest.mark.parametrize("prompt, question", [
+    ("How can I lose weight?", "How can I lose weight?"),
+    ("how can i lose weight", "How can I lose weight?"),
+    ("how do i lose weight", "How can I lose weight?"),
+    ("what should i eat after workout", "What should I eat after a workout?"),
+    ("What should I eat after a workuot?", "What should I eat after a workout?"),
+    ("Suggest a good workout for beginner", "Suggest a good workout for beginners!"),
+    ("i have no motivation to excercise", "I have no motivation to exercise!"),
+    ("Can you suggest cardio exercises?", "Can you suggest some cardio exercises!"),
+])
+def test_paraphrasesMatchTheirFAQ(matcher, prompt, question):
+    matched = matcher.match(prompt)
+    assert matched is not None and matched[0] == question
+
+
+@pytest.mark.parametrize("prompt", [
+    "what should i not eat after a workout",
+    "What are some bad abs exercises?",
+    "I have no motivation to diet!",
+    "What should I drink after a workout?",
+    "What should I eat before bed",
+    "What is the capital of Spain?",
+    "Plan a deadlift progression",
+])
+def test_promptsWithADifferentMeaningDoNotMatch(matcher, prompt):
+    assert matcher.match(prompt) is None
+
+
+def test_emptyFAQSetNeverMatches():
+    assert FAQMatcher({}).match("How can I lose weight?") is None
@@ -0,0 +1,78 @@
+from history_manager import ConversationHistory, Message, estimateTokens
+
+INJURY = "I hurt my left knee last year, so please avoid deep squats and jumping."
+
+
+def longTurn(role: str, i: int) -> str:
+    return f"{role} turn {i}. " + "We talked about sets, reps, rest times and weekly training volume in detail. " * 8
+
+
+def chat(history: ConversationHistory, turns: int, transcript: list = None):
+    for i in range(turns):
+        for role in ("user", "model"):
+            message = history.append(role, longTurn(role, i))
+            if transcript is not None:
+                transcript.append(message)
+
+
+def contentTokens(history: ConversationHistory) -> int:
+    return sum(estimateTokens(part["text"]) for content in history.contents() for part in content["parts"])
+
+
+def test_shortHistoryIsSentVerbatim():
+    history = ConversationHistory(token_budget=1000, summary_budget=200)
+    history.append("user", "How many push-ups should I do?")
+    history.append("model", "Start with three sets of as many as you can with good form.")
+
+    assert history.summary_lines == []
+    assert [content["role"] for content in history.contents()] == ["user", "model"]
+    assert history.tokenCount() == contentTokens(history)
+
+
+def test_earlyInjuryTurnSurvivesManyLongTurns():
+    history = ConversationHistory(token_budget=600, summary_budget=200)
+    history.append("user", INJURY)
+    history.append("model", "Thanks for telling me. We'll keep your knee in mind.")
+    chat(history, 40)
+
+    summary = history.contents()[0]["parts"][0]["text"]
+    assert "hurt my left knee" in summary
+    assert any(important for _, _, important in history.summary_lines)
+    assert not any("turn 0." in line for line, _, _ in history.summary_lines)
+
+
+def test_tokenCountStaysWithinBudgetAndCoversTheSummary():
+    history = ConversationHistory(token_budget=600, summary_budget=200)
+    history.append("user", INJURY)
+    for i in range(40):
+        history.append("user", longTurn("user", i))
+        history.append("model", longTurn("model", i))
+        assert history.tokenCount() <= history.token_budget + history.summary_budget
+        assert contentTokens(history) <= history.tokenCount()
+
+
+def test_requestContentsAlternateStartingWithTheUser():
+    # Long model replies can fold their own user turn; the next user turn then folds the orphaned reply.
+    history = ConversationHistory(token_budget=300, summary_budget=200)
+    for i in range(10):
+        history.append("user", f"Question {i}: how should I progress my squat?")
+        roles = [content["role"] for content in history.contents()]
+        assert roles[0] == "user" and history.turns[0].role == "user"
+        assert all(a != b for a, b in zip(roles, roles[1:]))
+        history.append("model", longTurn("model", i) * 2)
+
+
+def test_stateRoundTripRebuildsTheSameContents():
+    transcript = []
+    history = ConversationHistory(token_budget=600, summary_budget=200)
+    transcript.append(history.append("user", INJURY))
+    chat(history, 12, transcript)
+
+    state = history.toState()
+    copies = [Message(message.role, message.text) for message in transcript]
+    restored = ConversationHistory.fromState(state, copies, token_budget=600, summary_budget=200)
+
+    assert restored.contents() == history.contents()
+    assert restored.tokenCount() == history.tokenCount()
+    restored.append("user", "What about lunges?")
+    assert restored.turns[-1].text == "What about lunges?"
@@ -0,0 +1,9 @@
+from benchmarks.load_test import percentile
+
+
+def test_percentileIsNearestRank():
+    values = list(range(1, 101))
+    assert [percentile(values, q) for q in (0.5, 0.95, 0.99, 1.0)] == [50, 95, 99, 100]
+    assert percentile(list(range(1, 201)), 0.95) == 190
+    assert percentile([7], 0.99) == 7
+    assert percentile([], 0.5) == 0.0
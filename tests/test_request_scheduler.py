@@ -0,0 +1,85 @@
+import asyncio
+
+from benchmarks.fake_gemini import REPLY_WORDS
+from conftest import collect, runOnLoop
+from metrics import STAGE_SECONDS
+
+FULL_REPLY = " ".join(REPLY_WORDS) + " "
+PROMPT = "Plan a deadlift progression"
+
+
+async def drain(agen) -> list:
+    return [item async for item in agen]
+
+
+def test_rateLimitedCallIsRetried(fakeGemini, makeEngine):
+    server = fakeGemini(["rate_limit"], retry_after=0.05)
+    engine = makeEngine(server)
+    reply = runOnLoop(engine.chat("s1", PROMPT))
+
+    assert reply.status == "ok" and reply.text == FULL_REPLY
+    assert engine.scheduler.retries == 1
+    assert server.RequestHandlerClass.config.requests == 2
+
+
+def test_rateLimitedStreamIsRetried(fakeGemini, makeEngine):
+    server = fakeGemini(["rate_limit"], retry_after=0.05)
+    engine = makeEngine(server)
+    reply = collect(engine.chat_stream("s1", PROMPT))[-1]
+
+    assert reply.status == "ok" and reply.text == FULL_REPLY
+    assert engine.scheduler.retries == 1
+    assert server.RequestHandlerClass.config.requests == 2
+
+
+def test_identicalStreamsShareOneCall(fakeGemini, makeEngine):
+    server = fakeGemini(latency=0.4)
+    engine = makeEngine(server)
+
+    async def scenario():
+        return await asyncio.gather(*(drain(engine.chat_stream(f"s{i}", PROMPT)) for i in range(3)))
+
+    finals = [replies[-1] for replies in runOnLoop(scenario())]
+    assert [reply.text for reply in finals] == [FULL_REPLY] * 3
+    assert engine.scheduler.coalesced == 2
+    assert server.RequestHandlerClass.config.requests == 1
+
+
+def test_followerRecoversWhenLeaderIsCancelled(fakeGemini, makeEngine):
+    server = fakeGemini(latency=1.0, first_token_latency=0.05)
+    engine = makeEngine(server)
+
+    async def scenario():
+        leader = asyncio.ensure_future(drain(engine.chat_stream("leader", PROMPT)))
+        await asyncio.sleep(0.1)
+        follower = asyncio.ensure_future(drain(engine.chat_stream("follower", PROMPT)))
+        await asyncio.sleep(0.3)
+        leader.cancel()
+        return await follower
+
+    reply = runOnLoop(scenario())[-1]
+    assert reply.status == "ok" and reply.text == FULL_REPLY
+    assert engine.scheduler.coalesced == 1
+    assert server.RequestHandlerClass.config.requests == 2
+
+    cached = runOnLoop(engine.chat("other", PROMPT))
+    assert cached.source == "cache" and cached.text == FULL_REPLY
+
+
+def test_retryWaitIsReportedAsAdmissionNotNetwork(fakeGemini, makeEngine):
+    engine = makeEngine(fakeGemini(["rate_limit"], retry_after=0.3, latency=0.05))
+    admission, network = STAGE_SECONDS.total("admission"), STAGE_SECONDS.total("network")
+    reply = runOnLoop(engine.chat("s1", PROMPT))
+
+    assert reply.status == "ok"
+    assert STAGE_SECONDS.total("admission") - admission >= 0.3
+    assert STAGE_SECONDS.total("network") - network < 0.3
+
+
+def test_retryAfterIsHonoredBeyondTheBackoffCap(fakeGemini, makeEngine):
+    engine = makeEngine(fakeGemini(["rate_limit"], retry_after=0.4, latency=0.05), backoff_max=0.05)
+    admission = STAGE_SECONDS.total("admission")
+    reply = runOnLoop(engine.chat("s1", PROMPT))
+
+    assert reply.status == "ok" and engine.scheduler.retries == 1
+    assert STAGE_SECONDS.total("admission") - admission >= 0.4
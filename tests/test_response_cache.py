@@ -0,0 +1,36 @@
+from chat_engine import GENERATION_CONFIG
+from response_cache import ResponseCache, makeCacheKey
+
+
+def test_cacheKeyIsStableAcrossReleases():
+    # Keys are persisted in SQLite; changing how they are derived orphans every stored entry.
+    contents = [{"role": "user", "parts": [{"text": "Qué es el HIIT?"}]}, {"role": "model", "parts": [{"text": "Entrenamiento por intervalos 💪"}]},
+                {"role": "user", "parts": [{"text": "Plan a deadlift progression"}]}]
+    assert makeCacheKey("Plan a deadlift progression!", contents, GENERATION_CONFIG) == \
+        "8691376ba715b2b041b4d35a2798b6c7af52d7c6234154e1a5ad05b97e402339"
+
+
+def test_cacheEntriesSurviveReopening(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    cache.put("key", "answer")
+    cache.close()
+
+    reopened = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    assert reopened.get("key") == "answer"
+    assert reopened.stats()["disk_hits"] == 1
+    reopened.close()
+
+
+def test_hotKeySurvivesTrimAndRestart(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    cache = ResponseCache(path, max_disk_entries=3)
+    cache.put("hot", "hot answer")
+    for i in range(150):
+        cache.put(f"cold-{i}", "cold answer")
+        assert cache.get("hot") == "hot answer"
+    assert cache.stats()["disk_hits"] == 0
+    cache.close()
+
+    reopened = ResponseCache(path, max_disk_entries=3)
+    assert reopened.get("hot") == "hot answer"
+    reopened.close()
@@ -0,0 +1,61 @@
+from benchmarks.fake_gemini import REPLY_WORDS
+from conftest import collect
+
+FULL_REPLY = " ".join(REPLY_WORDS) + " "
+
+
+def test_streamAccumulatesPartialText(fakeGemini, makeEngine):
+    engine = makeEngine(fakeGemini(chunks=6))
+    chunks = collect(engine.streamResponseFromAPI("Plan a deadlift progression", [{"role": "user", "parts": [{"text": "Plan a deadlift progression"}]}]))
+
+    assert len(chunks) == 6
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.startswith(previous) and len(current) > len(previous)
+    assert chunks[-1] == FULL_REPLY
+
+
+def test_chatStreamYieldsPartialsThenFinalReply(fakeGemini, makeEngine):
+    engine = makeEngine(fakeGemini(chunks=4))
+    replies = collect(engine.chat_stream("s1", "Plan a deadlift progression"))
+
+    assert [reply.partial for reply in replies] == [True] * 4 + [False]
+    assert replies[-1].status == "ok" and replies[-1].source == "api"
+    assert replies[-1].text == FULL_REPLY
+    assert engine.response_cache.stats()["memory_entries"] == 1
+
+
+def test_safetyFinishMidStreamKeepsPartialTextWithNote(fakeGemini, makeEngine):
+    engine = makeEngine(fakeGemini(["safety"], chunks=8))
+    chunks = collect(engine.streamResponseFromAPI("Plan a deadlift progression", [{"role": "user", "parts": [{"text": "Plan a deadlift progression"}]}]))
+
+    assert chunks[-1].startswith("SAFETY_WARNING::")
+    partial = chunks[-2]
+    assert partial and chunks[-1] == f"SAFETY_WARNING::{partial}\n\n*[Note: This response may have been modified due to safety settings.]*"
+    assert len(partial) < len(FULL_REPLY)
+
+
+def test_safetyReplyIsNotCached(fakeGemini, makeEngine):
+    engine = makeEngine(fakeGemini(["safety"], chunks=8))
+    reply = collect(engine.chat_stream("s1", "Plan a deadlift progression"))[-1]
+
+    assert reply.status == "safety" and reply.notice
+    assert engine.response_cache.stats()["memory_entries"] == 0
+
+
+def test_blockedPromptInStream(fakeGemini, makeEngine):
+    engine = makeEngine(fakeGemini(["blocked"]))
+    chunks = collect(engine.streamResponseFromAPI("Plan a deadlift progression", [{"role": "user", "parts": [{"text": "Plan a deadlift progression"}]}]))
+
+    assert chunks == ["BLOCKED_PROMPT::Your request could not be processed because it was blocked: SAFETY. Please rephrase your message."]
+    reply = collect(makeEngine(fakeGemini(["blocked"])).chat_stream("s1", "Plan a deadlift progression"))[-1]
+    assert reply.status == "blocked"
+
+
+def test_serverErrorInStream(fakeGemini, makeEngine):
+    engine = makeEngine(fakeGemini(["error"]), max_retries=0)
+    chunks = collect(engine.streamResponseFromAPI("Plan a deadlift progression", [{"role": "user", "parts": [{"text": "Plan a deadlift progression"}]}]))
+
+    assert len(chunks) == 1
+    assert chunks[0].startswith("ERROR::There was an issue with the API (Status 500): An internal error has occurred.")
+    reply = collect(makeEngine(fakeGemini(["error"]), max_retries=0).chat_stream("s1", "Plan a deadlift progression"))[-1]
+    assert reply.status == "error"